@@ -1,23 +1,58 @@
 import os
 import sys
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 import httpx
+import orjson
 from mcp.server.fastmcp import FastMCP
 from mcp.types import CallToolResult, TextContent, Resource, GetPromptResult
 from dotenv import load_dotenv
 import logging
-import json
 from urllib.parse import urlencode
 import asyncio
+import sqlite3
 from datetime import datetime
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from itertools import islice
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import importlib.util
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+try:
+    import uvloop  # Opcional: loop de eventos baseado em libuv
+except ImportError:
+    uvloop = None
+
+# HTTP/2 no httpx depende do pacote h2 (extra httpx[http2]); sem ele, usa HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
+# Configurar logging (nível e arquivo opcionais via ambiente)
+EIA_LOG_LEVEL = os.getenv("EIA_LOG_LEVEL", "INFO").upper()
+EIA_LOG_FILE = os.getenv("EIA_LOG_FILE")
+logging.basicConfig(level=getattr(logging, EIA_LOG_LEVEL, logging.INFO))
+logger = logging.getLogger(__name__)
+# O httpx registra em INFO a URL completa de cada requisição, com a api_key; a URL sem a chave
+# é registrada por fetch_eia_api
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+log_listener: Optional[QueueListener] = None
+if EIA_LOG_FILE:
+    try:
+        file_handler = logging.FileHandler(EIA_LOG_FILE, encoding="utf-8")
+    except OSError as e:
+        # Arquivo de log inacessível não impede o servidor de subir: segue só com o stderr
+        logger.warning(f"Não foi possível abrir EIA_LOG_FILE ({EIA_LOG_FILE}): {e}. Registrando apenas no stderr.")
+    else:
+        # A escrita no arquivo roda numa thread própria; o loop de eventos só enfileira o registro
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        log_listener = QueueListener(log_queue, file_handler)
+        logger.addHandler(QueueHandler(log_queue))
+        log_listener.start()
+
 # --- Configurações da API da EIA ---
 EIA_API_BASE_URL = "https://api.eia.gov/v2"
 EIA_API_KEY = os.getenv("EIA_API_KEY")
@@ -68,9 +103,257 @@ CONCEPT_MAPPING = {
     }
 }
 
-# --- Cache simples para metadados ---
-metadata_cache = {}
-cache_ttl = 3600  # 1 hora
+# Palavras-chave normalizadas (lower) por conceito, calculadas uma única vez na importação
+CONCEPT_KEYWORDS_LOWER = {
+    concept: tuple(keyword.lower() for keyword in data["keywords"])
+    for concept, data in CONCEPT_MAPPING.items()
+}
+
+# --- Cache de respostas (LRU limitado + TTL) ---
+# Metadados mudam raramente: validade longa. Dados (/data) podem ser grandes e são
+# atualizados pela EIA, então têm cache próprio, menor e de validade curta.
+metadata_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+cache_ttl = int(os.getenv("EIA_META_TTL", 3600))  # 1 hora
+cache_max_entries = int(os.getenv("EIA_META_CACHE_SIZE", 512))
+
+data_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+data_cache_ttl = int(os.getenv("EIA_DATA_TTL", 300))  # 5 minutos
+data_cache_max_entries = int(os.getenv("EIA_DATA_CACHE_SIZE", 32))
+
+def get_cached_entry(cache: "OrderedDict[str, Dict[str, Any]]", cache_key: str, ttl: int) -> Optional[Dict[str, Any]]:
+    """Retorna a entrada do cache se ainda válida, descartando-a se expirou."""
+    cache_entry = cache.get(cache_key)
+    if cache_entry is None:
+        return None
+    if (datetime.now().timestamp() - cache_entry['timestamp']) >= ttl:
+        # Com ETag/Last-Modified a entrada expirada fica para a revalidação condicional
+        if not (cache_entry.get('etag') or cache_entry.get('last_modified')):
+            del cache[cache_key]
+        return None
+    cache.move_to_end(cache_key)
+    return cache_entry['data']
+
+def store_cached_entry(cache: "OrderedDict[str, Dict[str, Any]]", cache_key: str, data: Dict[str, Any], max_entries: int,
+                       etag: Optional[str] = None, last_modified: Optional[str] = None,
+                       timestamp: Optional[float] = None) -> None:
+    """Armazena no cache, removendo as entradas menos usadas acima do limite.
+
+    timestamp é o momento da busca na API (padrão: agora); entradas vindas do disco mantêm o original.
+    """
+    cache[cache_key] = {
+        'data': data,
+        'timestamp': datetime.now().timestamp() if timestamp is None else timestamp,
+        'etag': etag,
+        'last_modified': last_modified
+    }
+    cache.move_to_end(cache_key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+def get_cached_metadata(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Consulta o cache de metadados."""
+    return get_cached_entry(metadata_cache, cache_key, cache_ttl)
+
+def store_cached_metadata(cache_key: str, data: Dict[str, Any],
+                          etag: Optional[str] = None, last_modified: Optional[str] = None,
+                          timestamp: Optional[float] = None) -> None:
+    """Armazena no cache de metadados, com os validadores HTTP quando a EIA os envia."""
+    store_cached_entry(metadata_cache, cache_key, data, cache_max_entries, etag, last_modified, timestamp)
+
+def conditional_headers(cache_entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Cabeçalhos If-None-Match/If-Modified-Since a partir de uma entrada expirada do cache."""
+    headers = {}
+    if cache_entry is not None:
+        if cache_entry.get('etag'):
+            headers['If-None-Match'] = cache_entry['etag']
+        if cache_entry.get('last_modified'):
+            headers['If-Modified-Since'] = cache_entry['last_modified']
+    return headers
+
+def get_cached_data(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Consulta o cache de respostas de dados (/data e séries)."""
+    return get_cached_entry(data_cache, cache_key, data_cache_ttl)
+
+def store_cached_data(cache_key: str, data: Dict[str, Any]) -> None:
+    """Armazena no cache de respostas de dados (/data e séries)."""
+    store_cached_entry(data_cache, cache_key, data, data_cache_max_entries)
+
+def is_data_route(route_path: str) -> bool:
+    """Rotas que retornam dados (atualizados pela EIA) em vez de metadados."""
+    return route_path.endswith('/data') or route_path.startswith('seriesid/')
+
+# --- Cache de metadados em disco (opcional, sobrevive a reinícios) ---
+# Ativado com EIA_CACHE_DIR; consultado depois do cache em memória e antes da API.
+# Guarda o momento original da busca e os validadores HTTP: a validade continua sendo
+# EIA_META_TTL a partir da busca, e EIA_DISK_CACHE_TTL é quanto tempo a linha fica
+# disponível para revalidação condicional.
+EIA_CACHE_DIR = os.getenv("EIA_CACHE_DIR")
+disk_cache_ttl = int(os.getenv("EIA_DISK_CACHE_TTL", 86400))  # 24 horas
+disk_cache: Optional[sqlite3.Connection] = None
+disk_cache_enabled = bool(EIA_CACHE_DIR)
+
+def get_disk_cache() -> Optional[sqlite3.Connection]:
+    """Abre o banco SQLite do cache em disco na primeira chamada, se configurado."""
+    global disk_cache, disk_cache_enabled
+    if disk_cache is None and disk_cache_enabled:
+        try:
+            os.makedirs(EIA_CACHE_DIR, exist_ok=True)
+            disk_cache = sqlite3.connect(os.path.join(EIA_CACHE_DIR, "metadata.sqlite3"), isolation_level=None)
+            disk_cache.execute(
+                "CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, data BLOB NOT NULL, timestamp REAL NOT NULL,"
+                " etag TEXT, last_modified TEXT)"
+            )
+            # Bancos criados antes das colunas de validadores
+            columns = {row[1] for row in disk_cache.execute("PRAGMA table_info(metadata)")}
+            for column in ("etag", "last_modified"):
+                if column not in columns:
+                    disk_cache.execute(f"ALTER TABLE metadata ADD COLUMN {column} TEXT")
+            # Remove entradas expiradas de execuções anteriores
+            disk_cache.execute("DELETE FROM metadata WHERE timestamp <= ?", (datetime.now().timestamp() - disk_cache_ttl,))
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Cache em disco desativado: {e}")
+            disk_cache = None
+            disk_cache_enabled = False
+    return disk_cache
+
+def load_disk_metadata(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Retorna a entrada do cache em disco (dados, momento da busca e validadores) se ainda retida."""
+    db = get_disk_cache()
+    if db is None:
+        return None
+    try:
+        row = db.execute(
+            "SELECT data, timestamp, etag, last_modified FROM metadata WHERE key = ?", (cache_key,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao ler cache em disco: {e}")
+        return None
+    if row is None or (datetime.now().timestamp() - row[1]) >= disk_cache_ttl:
+        return None
+    try:
+        data = orjson.loads(row[0])
+    except orjson.JSONDecodeError as e:
+        # Linha truncada (ex.: processo interrompido): descarta para a próxima busca regravá-la
+        logger.warning(f"Entrada corrompida no cache em disco descartada: {e}")
+        try:
+            db.execute("DELETE FROM metadata WHERE key = ?", (cache_key,))
+        except sqlite3.Error as e:
+            logger.warning(f"Erro ao gravar cache em disco: {e}")
+        return None
+    return {
+        'data': data,
+        'timestamp': row[1],
+        'etag': row[2],
+        'last_modified': row[3]
+    }
+
+def save_disk_metadata(cache_key: str, data: Dict[str, Any],
+                       etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+    """Grava a entrada no cache em disco, se configurado."""
+    db = get_disk_cache()
+    if db is None:
+        return
+    try:
+        db.execute(
+            "INSERT OR REPLACE INTO metadata (key, data, timestamp, etag, last_modified) VALUES (?, ?, ?, ?, ?)",
+            (cache_key, orjson.dumps(data), datetime.now().timestamp(), etag, last_modified)
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao gravar cache em disco: {e}")
+
+def touch_disk_metadata(cache_key: str) -> None:
+    """Renova o momento da busca de uma entrada em disco revalidada (304), sem regravar os dados."""
+    db = get_disk_cache()
+    if db is None:
+        return
+    try:
+        db.execute("UPDATE metadata SET timestamp = ? WHERE key = ?", (datetime.now().timestamp(), cache_key))
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao gravar cache em disco: {e}")
+
+def clear_disk_cache() -> int:
+    """Remove todas as entradas do cache em disco e retorna quantas havia."""
+    db = get_disk_cache()
+    if db is None:
+        return 0
+    try:
+        return db.execute("DELETE FROM metadata").rowcount
+    except sqlite3.Error as e:
+        logger.warning(f"Erro ao limpar cache em disco: {e}")
+        return 0
+
+def close_disk_cache() -> None:
+    """Fecha a conexão com o cache em disco."""
+    global disk_cache
+    if disk_cache is not None:
+        disk_cache.close()
+        disk_cache = None
+
+# Requisições em andamento, por chave de cache (singleflight)
+inflight_requests: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+# Incrementado a cada limpeza do cache: respostas de buscas iniciadas antes dela não são armazenadas
+cache_generation = 0
+
+# Pré-carregamento dos metadados das sub-rotas listadas (desative com EIA_PREFETCH_SUBROUTES=0)
+EIA_PREFETCH_SUBROUTES = os.getenv("EIA_PREFETCH_SUBROUTES", "1") != "0"
+# Sub-rotas cujo pré-carregamento falhou e o momento da falha: não são tentadas de novo por EIA_META_TTL
+prefetch_failures: Dict[str, float] = {}
+# Mantém referência às tarefas em segundo plano até terminarem
+background_tasks: "set[asyncio.Task[Any]]" = set()
+
+# --- Cliente HTTP compartilhado (pool de conexões keep-alive) ---
+# Configurável para evitar reutilizar conexões ociosas que o servidor já fechou
+EIA_KEEPALIVE_EXPIRY = float(os.getenv("EIA_KEEPALIVE_EXPIRY", 30))
+http_client: Optional[httpx.AsyncClient] = None
+
+# Limita requisições simultâneas à EIA (consultas em paralelo respeitam o rate limit)
+EIA_MAX_CONCURRENCY = int(os.getenv("EIA_MAX_CONCURRENCY", 8))
+eia_request_semaphore = asyncio.Semaphore(EIA_MAX_CONCURRENCY)
+# Novas tentativas quando a EIA responde 429 (limite de requisições) ou está sobrecarregada,
+# e em falhas de conexão; espera exponencial, ou a indicada em Retry-After
+EIA_MAX_RETRIES = int(os.getenv("EIA_MAX_RETRIES", 2))
+RETRY_STATUS_CODES = frozenset({429, 502, 503})
+# Só erros em que a requisição não chegou a ser processada (timeout de leitura não entra: já esperou 90s)
+RETRY_REQUEST_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+MAX_RETRY_DELAY = 60.0
+
+def retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    """Espera antes da próxima tentativa: Retry-After (em segundos) se presente, senão exponencial."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), MAX_RETRY_DELAY)
+            except ValueError:
+                pass  # Formato de data HTTP: usa a espera exponencial
+    return float(2 ** attempt)
+
+def get_http_client() -> httpx.AsyncClient:
+    """Retorna o cliente HTTP compartilhado, criando-o na primeira chamada."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            base_url=EIA_API_BASE_URL,
+            headers=EIA_HEADERS,
+            # Enviada em toda requisição; o httpx mescla com os parâmetros de cada chamada
+            params={"api_key": EIA_API_KEY} if EIA_API_KEY else None,
+            # Leitura longa para consultas pesadas; conexão falha rápido se a EIA estiver inacessível
+            timeout=httpx.Timeout(90.0, connect=10.0),
+            http2=HTTP2_AVAILABLE,  # Multiplexa as requisições paralelas numa única conexão
+            limits=httpx.Limits(
+                max_keepalive_connections=20,
+                max_connections=100,
+                keepalive_expiry=EIA_KEEPALIVE_EXPIRY
+            )
+        )
+    return http_client
+
+async def close_http_client() -> None:
+    """Fecha o cliente HTTP compartilhado e libera as conexões do pool."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
 
 # --- Inicialização do Servidor MCP ---
 mcp = FastMCP(
@@ -94,15 +377,12 @@ def format_eia_params(params: Dict[str, Any]) -> Dict[str, Any]:
             
         if key == "facets" and isinstance(value, dict):
             # Formatação especial para facets: facets[stateid][]=TX&facets[stateid][]=CA
+            # (lista montada de uma vez por facet, sem append valor a valor)
             for facet_key, facet_values in value.items():
-                if isinstance(facet_values, list):
-                    for facet_value in facet_values:
-                        param_key = f"facets[{facet_key}][]"
-                        if param_key not in formatted_params:
-                            formatted_params[param_key] = []
-                        formatted_params[param_key].append(facet_value)
-                else:
+                if not isinstance(facet_values, list):
                     formatted_params[f"facets[{facet_key}][]"] = [facet_values]
+                elif facet_values:
+                    formatted_params[f"facets[{facet_key}][]"] = list(facet_values)
         elif key == "data" and isinstance(value, list):
             # data[0]=value&data[1]=price
             for i, item in enumerate(value):
@@ -113,161 +393,438 @@ def format_eia_params(params: Dict[str, Any]) -> Dict[str, Any]:
                 if isinstance(sort_item, dict):
                     for sort_key, sort_value in sort_item.items():
                         formatted_params[f"sort[{i}][{sort_key}]"] = sort_value
-        elif isinstance(value, list) and key not in ["facets", "data", "sort"]:
-            # CORREÇÃO: Verificar se a lista não está vazia antes do join
-            if value:  # Só fazer join se a lista não estiver vazia
-                formatted_params[key] = ",".join(map(str, value))
+        elif isinstance(value, list) and key not in ("facets", "data", "sort"):
+            # Lista já garantida não vazia pela verificação no início do loop
+            formatted_params[key] = ",".join(map(str, value))
         else:
             formatted_params[key] = value
     
     return formatted_params
 
-async def make_eia_api_request(route_path: str, params: Optional[Dict[str, Any]] = None, use_cache: bool = True) -> Optional[Dict[str, Any]]:
-    """Faz requisição à API da EIA com cache e tratamento robusto de erros."""
+def redacted_url(url: httpx.URL) -> str:
+    """URL da requisição sem o parâmetro api_key, para logs e mensagens de erro."""
+    return str(url.copy_remove_param("api_key"))
+
+def truncate_text(value: Any, limit: int = 2000) -> str:
+    """Converte para texto limitando o tamanho; evita despejar corpos de erro inteiros na resposta."""
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} caracteres omitidos]"
+
+def make_cache_key(route_path: str, params: Dict[str, Any]) -> str:
+    """Chave de cache da requisição (sem api_key para segurança)."""
+    # orjson com chaves ordenadas inclusive nos dicts aninhados
+    return f"{route_path.strip('/')}_{orjson.dumps(params, option=orjson.OPT_SORT_KEYS).decode()}"
+
+async def make_eia_api_request(route_path: str, params: Optional[Dict[str, Any]] = None, use_cache: bool = True,
+                               store_response: bool = False) -> Optional[Dict[str, Any]]:
+    """Faz requisição à API da EIA com cache e tratamento robusto de erros.
+
+    Com use_cache=False a busca ignora o cache e o singleflight; store_response ainda assim
+    armazena a resposta, pelo mesmo caminho de fetch_eia_api que respeita limpezas do cache.
+    """
     if not EIA_API_KEY:
         logger.error("EIA_API_KEY não está definida")
         return {"error": "API_KEY_MISSING", "message": "Chave da API EIA não configurada"}
     
     # Normalizar route_path
     route_path = route_path.strip('/')
-    full_url = f"{EIA_API_BASE_URL}/{route_path}"
     
     if params is None:
         params = {}
     
-    # Cache key para metadados (sem api_key para segurança)
-    cache_key = f"{route_path}_{json.dumps(sorted(params.items()), sort_keys=True)}"
+    cache_key = make_cache_key(route_path, params)
+
+    if not use_cache:
+        return await fetch_eia_api(route_path, params, cache_key if store_response else None)
     
-    # Verificar cache para metadados (não para dados)
-    if use_cache and not route_path.endswith('/data') and cache_key in metadata_cache:
-        cache_entry = metadata_cache[cache_key]
-        if (datetime.now().timestamp() - cache_entry['timestamp']) < cache_ttl:
+    # Entrada de metadados expirada que ainda tem validadores: a busca vira um GET condicional
+    stale_entry = None
+
+    if is_data_route(route_path):
+        # Dados e séries: cache curto em memória, sem disco
+        cached = get_cached_data(cache_key)
+        if cached is not None:
+            logger.info(f"Retornando dados do cache: {route_path}")
+            return cached
+    else:
+        cached = get_cached_metadata(cache_key)
+        if cached is not None:
             logger.info(f"Retornando do cache: {route_path}")
-            return cache_entry['data']
-    
-    # Formatar parâmetros corretamente
+            return cached
+        # Expirada mas mantida (tem validadores): revalida direto, sem passar pelo disco
+        stale_entry = metadata_cache.get(cache_key)
+
+        if stale_entry is None:
+            # Segundo nível: cache em disco, evita refazer a busca após reiniciar o servidor.
+            # A entrada volta à memória com o momento original da busca e seus validadores,
+            # então só é servida se ainda estiver dentro de EIA_META_TTL
+            disk_entry = load_disk_metadata(cache_key)
+            if disk_entry is not None:
+                store_cached_metadata(cache_key, disk_entry['data'], disk_entry['etag'],
+                                      disk_entry['last_modified'], disk_entry['timestamp'])
+                cached = get_cached_metadata(cache_key)
+                if cached is not None:
+                    logger.info(f"Retornando do cache em disco: {route_path}")
+                    return cached
+                stale_entry = metadata_cache.get(cache_key)
+
+    # Singleflight: chamadas concorrentes para a mesma chave aguardam uma única requisição
+    task = inflight_requests.get(cache_key)
+    if task is None:
+        task = asyncio.create_task(fetch_eia_api(route_path, params, cache_key, stale_entry))
+        inflight_requests[cache_key] = task
+        task.add_done_callback(lambda done: discard_inflight_request(cache_key, done))
+    else:
+        logger.info(f"Aguardando requisição em andamento: {route_path}")
+    # shield: o cancelamento de um chamador não cancela a requisição compartilhada
+    return await asyncio.shield(task)
+
+def discard_inflight_request(cache_key: str, task: "asyncio.Task[Dict[str, Any]]") -> None:
+    """Remove a requisição do registro de andamento, se ainda for a registrada para a chave."""
+    # Após uma limpeza do cache, a chave pode já apontar para uma busca mais nova
+    if inflight_requests.get(cache_key) is task:
+        del inflight_requests[cache_key]
+
+async def fetch_eia_api(route_path: str, params: Dict[str, Any], cache_key: Optional[str] = None,
+                        stale_entry: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Executa a requisição HTTP à EIA; com cache_key, armazena a resposta no cache correspondente.
+
+    Com stale_entry (metadados expirados com ETag/Last-Modified), a requisição é condicional
+    e um 304 reaproveita o corpo já decodificado.
+    """
+    # Geração do cache no início da busca: se o cache for limpo no meio, a resposta não é armazenada
+    generation = cache_generation
+
+    # Formatar parâmetros corretamente (a api_key vem dos parâmetros fixos do cliente)
     formatted_params = format_eia_params(params)
-    formatted_params['api_key'] = EIA_API_KEY
+    request_headers = conditional_headers(stale_entry)
     
-    # Log detalhado para debug
-    temp_params = {k: v for k, v in formatted_params.items() if k != 'api_key'}
-    logger.info(f"URL: {full_url}")
-    logger.info(f"Parâmetros formatados: {json.dumps(temp_params, indent=2)}")
+    # Logs montados só se o nível estiver habilitado; os parâmetros já aparecem na "URL final",
+    # então o dump indentado fica para DEBUG
+    log_info = logger.isEnabledFor(logging.INFO)
+    if log_info:
+        logger.info(f"URL: {EIA_API_BASE_URL}/{route_path}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Parâmetros formatados: {orjson.dumps(formatted_params, option=orjson.OPT_INDENT_2).decode()}")
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                full_url, 
-                params=formatted_params, 
-                headers=EIA_HEADERS, 
-                timeout=90.0  # Timeout aumentado
-            )
-            
-            # Log da URL final (sem api_key)
-            url_without_key = str(response.url).replace(f"api_key={EIA_API_KEY}", "api_key=***")
-            logger.info(f"URL final: {url_without_key}")
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            # Cache para metadados
-            if use_cache and not route_path.endswith('/data'):
-                metadata_cache[cache_key] = {
-                    'data': result,
-                    'timestamp': datetime.now().timestamp()
-                }
-            
-            return result
-            
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Erro HTTP EIA API: {e.response.status_code}")
-            logger.error(f"Response text: {e.response.text}")
+    try:
+        # Cliente compartilhado: reaproveita conexões TCP/TLS entre chamadas
+        for attempt in range(EIA_MAX_RETRIES + 1):
+            # Uma vaga do semáforo por tentativa: durante a espera ela fica livre para outras chamadas
+            async with eia_request_semaphore:
+                try:
+                    response = await get_http_client().get(route_path, params=formatted_params, headers=request_headers)
+                except RETRY_REQUEST_ERRORS as e:
+                    if attempt == EIA_MAX_RETRIES:
+                        raise
+                    delay = retry_delay(None, attempt)
+                    logger.warning(f"Falha de conexão com a EIA ({e!r}) para {route_path}; nova tentativa em {delay}s")
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt == EIA_MAX_RETRIES:
+                        break
+                    delay = retry_delay(response, attempt)
+                    logger.warning(f"EIA retornou {response.status_code} para {route_path}; nova tentativa em {delay}s")
+            await asyncio.sleep(delay)
+
+        # Log da URL final (sem api_key)
+        if log_info:
+            logger.info(f"URL final: {redacted_url(response.url)}")
+        logger.debug(f"Protocolo negociado: {response.http_version}")
+
+        if response.status_code == 304 and stale_entry is not None:
+            logger.info(f"Metadados não modificados (304), reaproveitando o cache: {route_path}")
+            if generation == cache_generation:
+                store_cached_metadata(cache_key, stale_entry['data'], stale_entry.get('etag'), stale_entry.get('last_modified'))
+                touch_disk_metadata(cache_key)
+            return stale_entry['data']
+
+        response.raise_for_status()
+        # orjson decodifica direto dos bytes, bem mais rápido que o json da stdlib em respostas grandes
+        result = orjson.loads(response.content)
+
+        # Respostas com erro, ou de buscas anteriores a uma limpeza do cache, não são armazenadas
+        if cache_key is not None and generation == cache_generation and not result.get('error'):
+            if is_data_route(route_path):
+                store_cached_data(cache_key, result)
+            else:
+                etag = response.headers.get('etag')
+                last_modified = response.headers.get('last-modified')
+                store_cached_metadata(cache_key, result, etag, last_modified)
+                save_disk_metadata(cache_key, result, etag, last_modified)
+
+        return result
+
+    except httpx.HTTPStatusError as e:
+        error_response = e.response
+        logger.error(f"Erro HTTP EIA API: {error_response.status_code}")
+        # Corpo decodificado uma única vez; o log é truncado para não despejar páginas de erro inteiras
+        response_text = error_response.text
+        logger.error(f"Response text: {truncate_text(response_text, 1000)}")
+        # Só tenta interpretar como JSON quando a EIA declara JSON (páginas HTML de proxy não)
+        if "json" in error_response.headers.get("content-type", ""):
             try:
-                error_response = e.response.json()
-                logger.error(f"Error details: {json.dumps(error_response, indent=2)}")
-                return error_response
-            except Exception:
-                return {
-                    "error": f"HTTPStatusError: {e.response.status_code}", 
-                    "message": e.response.text,
-                    "url": str(e.response.url).replace(f"api_key={EIA_API_KEY}", "api_key=***")
-                }
-        except httpx.RequestError as e:
-            logger.error(f"Erro de requisição EIA API: {e}")
-            return {"error": "RequestError", "message": str(e)}
-        except Exception as e:
-            logger.error(f"Erro inesperado EIA API: {e}")
-            return {"error": "UnexpectedError", "message": str(e)}
-
-def find_relevant_routes(query: str) -> List[str]:
+                return orjson.loads(error_response.content)
+            except orjson.JSONDecodeError:
+                pass
+        return {
+            "error": f"HTTPStatusError: {error_response.status_code}",
+            "message": truncate_text(response_text),
+            "url": redacted_url(error_response.url)
+        }
+    except httpx.RequestError as e:
+        logger.error(f"Erro de requisição EIA API: {e}")
+        return {"error": "RequestError", "message": str(e)}
+    except Exception as e:
+        logger.error(f"Erro inesperado EIA API: {e}")
+        return {"error": "UnexpectedError", "message": str(e)}
+
+async def bulk_request(route_paths: List[str]) -> List[Union[Dict[str, Any], BaseException]]:
+    """Busca os metadados de várias rotas em paralelo; falhas voltam como exceções na lista."""
+    return await asyncio.gather(*(make_eia_api_request(path) for path in route_paths), return_exceptions=True)
+
+async def warm_metadata_cache(route_paths: List[str]) -> None:
+    """Busca os metadados das rotas em paralelo apenas para preencher o cache."""
+    results = await bulk_request(route_paths)
+    failed_at = datetime.now().timestamp()
+    for route_path, result in zip(route_paths, results):
+        if isinstance(result, BaseException) or not result or result.get('error'):
+            # Respostas com erro não entram no cache: sem este registro, cada listagem tentaria de novo
+            prefetch_failures[route_path] = failed_at
+            logger.debug(f"Pré-carregamento falhou para {route_path}")
+
+def prefetch_route_metadata(route_paths: List[str]) -> None:
+    """Agenda o aquecimento do cache em segundo plano, sem atrasar a resposta atual."""
+    # No máximo metade das vagas do semáforo: a próxima chamada interativa não espera atrás do pré-carregamento
+    max_routes = EIA_MAX_CONCURRENCY // 2
+    if not EIA_PREFETCH_SUBROUTES or not route_paths or max_routes < 1:
+        return
+    now = datetime.now().timestamp()
+    route_paths = [
+        route_path for route_path in route_paths
+        if now - prefetch_failures.get(route_path, 0.0) >= cache_ttl
+        and get_cached_metadata(make_cache_key(route_path, {})) is None
+    ][:max_routes]
+    if not route_paths:
+        return
+    task = asyncio.create_task(warm_metadata_cache(route_paths))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def find_relevant_routes(query: str) -> Tuple[str, ...]:
     """Encontra rotas relevantes baseadas na consulta do usuário com scoring."""
-    query_lower = query.lower()
-    route_scores = {}
+    return score_relevant_routes(query.lower())
+
+@lru_cache(maxsize=1024)
+def score_relevant_routes(query_lower: str) -> Tuple[str, ...]:
+    """Pontua as rotas para uma consulta já normalizada (memoizado: consultas repetidas são O(1))."""
+    route_scores: Dict[str, int] = defaultdict(int)
     
     for concept, data in CONCEPT_MAPPING.items():
         score = 0
-        for keyword in data["keywords"]:
-            if keyword.lower() in query_lower:
+        for keyword in CONCEPT_KEYWORDS_LOWER[concept]:
+            if keyword in query_lower:
                 # Scoring baseado na especificidade e frequência
-                score += len(keyword) * query_lower.count(keyword.lower())
+                score += len(keyword) * query_lower.count(keyword)
         
         if score > 0:
             for route in data["routes"]:
-                if route not in route_scores:
-                    route_scores[route] = 0
                 route_scores[route] += score
     
-    # Retornar rotas ordenadas por score
-    return [route for route, _ in sorted(route_scores.items(), key=lambda x: x[1], reverse=True)]
+    # Retornar rotas ordenadas por score (tupla: imutável e segura para compartilhar via cache)
+    return tuple(route for route, _ in sorted(route_scores.items(), key=lambda x: x[1], reverse=True))
+
+def format_cell_value(value: Any) -> str:
+    """Formata o valor de uma célula da tabela (números grandes com separador de milhar)."""
+    # Coluna ausente ou valor null da API
+    if value is None:
+        return 'N/A'
+    if isinstance(value, str):
+        try:
+            # Tenta converter para float se houver ponto decimal, senão para int
+            value = float(value) if '.' in value else int(value)
+        except ValueError:
+            # Se não puder converter para número, mantém como string
+            return value
+    # Formatação especial para números (um único teste de tipo por ramo)
+    if isinstance(value, float):
+        return f"{value:,.2f}" if abs(value) >= 1000 else str(value)
+    if isinstance(value, int) and abs(value) >= 1000:
+        return f"{value:,}"
+    return str(value)
+
+@lru_cache(maxsize=64)
+def markdown_table_header(columns: Tuple[str, ...]) -> Tuple[str, str]:
+    """Monta as linhas de cabeçalho e separador da tabela markdown para as colunas."""
+    header_line = "| " + " | ".join(columns) + " |"
+    separator_line = "|" + "---|" * len(columns)
+    return header_line, separator_line
 
 def format_data_table(data: List[Dict], max_rows: int = 50) -> List[str]:
     """Formata dados em tabela markdown com limite de linhas."""
     if not data:
         return ["Nenhum dado encontrado."]
-    
-    output_lines = []
-    columns = list(data[0].keys())
-    
-    # Cabeçalho da tabela
-    header_line = "| " + " | ".join(columns) + " |"
-    separator_line = "|" + "---|".join(["---"] * len(columns)) + "|"
-    output_lines.extend([header_line, separator_line])
-    
-    # Dados da tabela (limitado)
-    display_data = data[:max_rows]
-    for row in display_data:
-        row_values = []
-        for col in columns:
-            value = row.get(col, 'N/A')
-            if isinstance(value, str):
-                try:
-                    # Tenta converter para float se houver ponto decimal, senão para int
-                    if '.' in value:
-                        converted_value = float(value)
-                    else:
-                        converted_value = int(value)
-                    # Se a conversão for bem-sucedida, use o valor convertido
-                    value = converted_value
-                except ValueError:
-                    # Se não puder converter para número, mantém como string
-                    pass
-            # Formatação especial para números
-            if isinstance(value, (int, float)):
-                if abs(value) >= 1000:
-                    formatted_value = f"{value:,.2f}" if isinstance(value, float) else f"{value:,}"
-                else:
-                    formatted_value = str(value) # Mantém números menores como string simples
-            else:
-                formatted_value = str(value) # Para valores não numéricos (como texto)
 
-            row_values.append(formatted_value)
-        output_lines.append("| " + " | ".join(row_values) + " |")
-    
+    columns = tuple(data[0])
+
+    # Cabeçalho da tabela (mesmo esquema de colunas por rota: reaproveitado do cache)
+    output_lines = list(markdown_table_header(columns))
+
+    # Dados da tabela (limitado): uma única passada por linha.
+    # join sobre list comprehension é mais rápido que sobre gerador (join materializa a sequência)
+    output_lines.extend(
+        "| " + " | ".join([format_cell_value(row.get(col)) for col in columns]) + " |"
+        for row in data[:max_rows]
+    )
+
     if len(data) > max_rows:
         output_lines.append(f"\n*Mostrando {max_rows} de {len(data)} registros*")
     
     return output_lines
 
+# --- Templates de resposta ---
+# Textos longos montados uma única vez no import; os dinâmicos usam str.format
+NO_ROUTES_TEMPLATE = """
+🔍 **Busca por**: "{query}"
+
+Não encontrei rotas específicas para sua consulta. Aqui estão as categorias principais disponíveis:
+
+{routes}
+
+💡 **Dicas para refinar sua busca:**
+- Use termos específicos como: "eletricidade", "petróleo", "gás natural", "carvão", "solar"
+- Especifique localização: "Texas", "Califórnia", "região sudeste"
+- Mencione tipo de dados: "consumo", "produção", "preços"
+- Indique período: "2023", "últimos 5 anos"
+
+**Exemplo**: "consumo de eletricidade residencial no Texas em 2023"
+                        """
+
+SUBROUTES_TEMPLATE = """
+📂 **Rota**: `{specific_route}`
+📊 **Sub-rotas disponíveis** ({total_subroutes} total):
+
+{subroutes}
+
+🎯 **Para obter dados**, escolha uma sub-rota específica e chame novamente:
+specific_route: "rota-escolhida"
+                """
+
+DATA_REQUEST_HINT = """
+🎯 **Para obter dados reais**, chame novamente especificando:
+data_elements: ["value"] # ou outros elementos disponíveis
+facets: {"filtro": ["valor"]} # opcional
+frequency: "monthly" # opcional
+start_period: "2020" # opcional
+end_period: "2023" # opcional
+                """
+
+NO_DATA_TEMPLATE = """
+❌ **Nenhum dado encontrado** para os critérios especificados.
+
+**Parâmetros utilizados**:
+- Rota: `{data_route}`
+- Elementos: `{elements_to_fetch}`
+- Filtros: `{facets}`
+- Frequência: `{frequency}`
+- Período: `{start_period}` até `{end_period}`
+
+💡 **Sugestões**:
+1. Tente ampliar o período de tempo
+2. Remova alguns filtros específicos
+3. Verifique se os valores dos filtros estão corretos
+4. Use a ferramenta `get_facet_values()` para ver opções válidas
+            """
+
+FACET_EXAMPLE_TEMPLATE = """
+💡 **Exemplo de uso**:
+```
+facets: {{"{facet_id}": ["{example_value}"]}}
+```
+        """
+
+NEXT_STEPS_TEXT = """
+💡 **Próximos passos**:
+1. Use `search_energy_data()` com uma rota específica
+2. Use `get_facet_values()` para ver filtros disponíveis
+3. Use `get_series_data()` se tiver um ID de série específico
+
+**Exemplo**: `search_energy_data(specific_route="electricity/retail-sales")`
+        """
+
+ENERGY_ANALYSIS_PROMPT_TEMPLATE = """# Análise de Dados Energéticos - {topic_title}
+
+## Contexto da Análise
+- **Tópico**: {topic}
+- **Escopo Geográfico**: {geographic_scope}
+- **Período**: {time_period}
+- **Tipo de Análise**: {analysis_type}
+
+## Objetivos da Análise
+1. Identificar tendências principais nos dados de {topic}
+2. Analisar padrões sazonais ou cíclicos
+3. Comparar diferentes regiões/setores quando aplicável
+4. Identificar fatores que influenciam as variações
+5. Fornecer insights acionáveis
+
+## Passos Recomendados
+1. **Descoberta de Dados**: Use `search_energy_data()` para encontrar dados relevantes sobre {topic}
+2. **Exploração**: Examine metadados e filtros disponíveis
+3. **Coleta**: Obtenha dados específicos com parâmetros adequados
+4. **Análise**: Identifique padrões, tendências e anomalias
+5. **Interpretação**: Contextualize os resultados com fatores externos
+
+## Considerações Especiais
+- Atenção a unidades de medida e conversões
+- Verificação de dados sazonalmente ajustados vs. não ajustados
+- Comparação com benchmarks históricos
+- Impacto de eventos externos (crises, políticas, clima)
+
+## Formato de Resultado Esperado
+- Resumo executivo dos principais achados
+- Visualizações ou tabelas dos dados chave
+- Análise de tendências com explicações
+- Recomendações ou insights para tomada de decisão
+"""
+
+ENERGY_CONCEPTS_TEXT = """# Conceitos Energéticos - EIA
+
+## Mapeamento de Conceitos
+
+### Eletricidade
+- **Palavras-chave**: eletricidade, energia elétrica, consumo energia, geração energia, preço energia, electricity, power, grid
+- **Rotas principais**: electricity, electricity/retail-sales, electricity/electric-power-operational-data
+
+### Petróleo
+- **Palavras-chave**: petróleo, gasolina, diesel, crude oil, combustível, refino, petroleum, oil, gasoline, refineries
+- **Rotas principais**: petroleum, petroleum/crd/crpdn, petroleum/supply/weekly
+
+### Gás Natural
+- **Palavras-chave**: gás natural, gas natural, lng, pipeline, natural gas, methane
+- **Rotas principais**: natural-gas, natural-gas/prod, natural-gas/cons
+
+### Carvão
+- **Palavras-chave**: carvão, coal, mineração carvão, carbon, mining
+- **Rotas principais**: coal, coal/production, coal/consumption
+
+### Energias Renováveis
+- **Palavras-chave**: renovável, solar, eólica, hidráulica, biomassa, renewable, wind, hydro, geothermal
+- **Rotas principais**: electricity/electric-power-operational-data, renewable
+
+### Nuclear
+- **Palavras-chave**: nuclear, uranium, reactor, nuclear power
+- **Rotas principais**: nuclear, nuclear/fuel-cycle
+
+### Energia Total
+- **Palavras-chave**: energia total, consumo total, balanço energético, total energy, energy balance
+- **Rotas principais**: total-energy, total-energy/data
+
+### Internacional
+- **Palavras-chave**: internacional, world, global, countries, export, import
+- **Rotas principais**: international
+"""
+
 # --- Ferramentas Principais Melhoradas ---
 @mcp.tool()
 async def search_energy_data(
@@ -303,11 +860,17 @@ async def search_energy_data(
         sort_direction: Direção da ordenação ("asc" ou "desc", padrão: "desc")
     """
     
+    # Busca antecipada dos dados (ver Fase 2); cancelada se a chamada terminar antes de usá-la
+    data_task: Optional["asyncio.Task[Optional[Dict[str, Any]]]"] = None
+
     try:
         # Validação de entrada
         if limit > 5000:
             limit = 5000
         
+        # Rotas descobertas pela consulta são categorias de topo, sempre com sub-rotas
+        route_was_given = bool(specific_route)
+
         # Fase 1: Descoberta de rotas se não especificada
         if not specific_route:
             relevant_routes = find_relevant_routes(query)
@@ -326,27 +889,51 @@ async def search_energy_data(
                             routes_info.append(f"  ↳ {route_desc}")
                     
                     return CallToolResult(
-                        content=[TextContent(type="text", text=f"""
-🔍 **Busca por**: "{query}"
-
-Não encontrei rotas específicas para sua consulta. Aqui estão as categorias principais disponíveis:
-
-{chr(10).join(routes_info)}
-
-💡 **Dicas para refinar sua busca:**
-- Use termos específicos como: "eletricidade", "petróleo", "gás natural", "carvão", "solar"
-- Especifique localização: "Texas", "Califórnia", "região sudeste"
-- Mencione tipo de dados: "consumo", "produção", "preços"
-- Indique período: "2023", "últimos 5 anos"
-
-**Exemplo**: "consumo de eletricidade residencial no Texas em 2023"
-                        """)]
+                        content=[TextContent(type="text", text=NO_ROUTES_TEMPLATE.format(
+                            query=query, routes="\n".join(routes_info)
+                        ))]
                     )
             
             # Usar a rota com melhor score
             specific_route = relevant_routes[0]
             logger.info(f"Rota descoberta automaticamente: {specific_route} (de {len(relevant_routes)} opções)")
         
+        # Parâmetros da requisição de dados
+        data_route = f"{specific_route.rstrip('/')}/data"
+        params = {
+            "length": min(limit, 5000),
+            "offset": 0
+        }
+
+        # Adicionar parâmetros
+        if frequency:
+            params["frequency"] = frequency
+        if start_period:
+            params["start"] = start_period
+        if end_period:
+            params["end"] = end_period
+        if facets and any(facets.values()):
+            params["facets"] = facets
+        if sort_column:
+            params["sort"] = [{"column": sort_column, "direction": sort_direction}]
+
+        # Com data_elements informado, os metadados só servem para validar e exibir:
+        # a busca dos dados começa já, em paralelo com a dos metadados. Só quando os metadados
+        # não estão em cache (senão não há o que sobrepor, e já se sabe se a rota tem sub-rotas)
+        # e os dados também não, e só se a rota veio do chamador (as descobertas têm sub-rotas e o
+        # /data seria desperdiçado). Sem cache nem singleflight (use_cache=False), a tarefa é
+        # cancelável de fato se a rota tiver sub-rotas ou a validação falhar; a resposta só
+        # entra no cache se nenhuma limpeza ocorreu durante a busca.
+        if data_elements:
+            params["data"] = data_elements
+            data_cache_key = make_cache_key(data_route, params)
+            if (route_was_given and get_cached_metadata(make_cache_key(specific_route, {})) is None
+                    and get_cached_data(data_cache_key) is None):
+                logger.info(f"Requisitando dados de: {data_route}")
+                data_task = asyncio.create_task(
+                    make_eia_api_request(data_route, params, use_cache=False, store_response=True)
+                )
+
         # Fase 2: Exploração de metadados
         metadata_response = await make_eia_api_request(specific_route, {})
         
@@ -358,11 +945,16 @@ Não encontrei rotas específicas para sua consulta. Aqui estão as categorias p
             )
         
         response_content = metadata_response.get('response', metadata_response)
+        # Campos usados em mais de um ponto da resposta, lidos uma única vez
+        subroutes = response_content.get('routes')
+        route_name = response_content.get('name')
+        route_description = response_content.get('description')
         
         # Se há sub-rotas, listá-las
-        if response_content.get('routes'):
+        if subroutes:
+            listed_subroutes = subroutes[:20]  # Limitar para não sobrecarregar
             subroutes_info = []
-            for subroute in response_content['routes'][:20]:  # Limitar para não sobrecarregar
+            for subroute in listed_subroutes:
                 subroute_id = subroute.get('id', 'N/A')
                 subroute_name = subroute.get('name', 'N/A')
                 subroute_desc = subroute.get('description', '')
@@ -371,20 +963,24 @@ Não encontrei rotas específicas para sua consulta. Aqui estão as categorias p
                 if subroute_desc:
                     subroutes_info.append(f"  ↳ {subroute_desc}")
             
-            total_subroutes = len(response_content['routes'])
+            total_subroutes = len(subroutes)
             if total_subroutes > 20:
                 subroutes_info.append(f"\n*... e mais {total_subroutes - 20} sub-rotas*")
             
+            # A próxima chamada costuma escolher uma destas sub-rotas: aquece o cache enquanto o modelo decide.
+            # Rota normalizada para que "electricity/" gere a mesma chave que a próxima chamada usará
+            base_route = specific_route.strip('/')
+            prefetch_route_metadata([
+                f"{base_route}/{subroute['id']}"
+                for subroute in listed_subroutes if subroute.get('id')
+            ])
+            
             return CallToolResult(
-                content=[TextContent(type="text", text=f"""
-📂 **Rota**: `{specific_route}`
-📊 **Sub-rotas disponíveis** ({total_subroutes} total):
-
-{chr(10).join(subroutes_info)}
-
-🎯 **Para obter dados**, escolha uma sub-rota específica e chame novamente:
-specific_route: "rota-escolhida"
-                """)]
+                content=[TextContent(type="text", text=SUBROUTES_TEMPLATE.format(
+                    specific_route=specific_route,
+                    total_subroutes=total_subroutes,
+                    subroutes="\n".join(subroutes_info)
+                ))]
             )
         
         # --- INÍCIO DA LÓGICA DE TRATAMENTO DE ELEMENTOS DE DADOS ---
@@ -405,22 +1001,22 @@ specific_route: "rota-escolhida"
                 # Exibe os metadados e pede para o usuário especificar.
                 metadata_info = [f"📋 **Metadados para**: `{specific_route}`\n"]
                 
-                if response_content.get('name'):
-                    metadata_info.append(f"**Nome**: {response_content['name']}")
-                if response_content.get('description'):
-                    metadata_info.append(f"**Descrição**: {response_content['description']}")
+                if route_name:
+                    metadata_info.append(f"**Nome**: {route_name}")
+                if route_description:
+                    metadata_info.append(f"**Descrição**: {route_description}")
                 
-                # Elementos de dados disponíveis (populados a partir de available_data_elements_meta)
-                if available_data_elements_meta:
-                    metadata_info.append("\n📊 **Elementos de dados disponíveis**:")
-                    for col_id, col_info in list(available_data_elements_meta.items())[:10]:  # Limitar
-                        if isinstance(col_info, dict):
-                            name = col_info.get('name', col_info.get('alias', col_id))
-                            units = col_info.get('units', 'N/A')
-                            metadata_info.append(f"  • `{col_id}`: {name} ({units})")
-                    
-                    if len(available_data_elements_meta) > 10:
-                        metadata_info.append(f"  *... e mais {len(available_data_elements_meta) - 10} elementos*")
+                # Elementos de dados disponíveis (não vazios neste ramo); islice evita copiar todos os itens
+                metadata_info.append("\n📊 **Elementos de dados disponíveis**:")
+                for col_id, col_info in islice(available_data_elements_meta.items(), 10):  # Limitar
+                    if isinstance(col_info, dict):
+                        # `or` só consulta o alias quando não há nome
+                        name = col_info.get('name') or col_info.get('alias') or col_id
+                        units = col_info.get('units', 'N/A')
+                        metadata_info.append(f"  • `{col_id}`: {name} ({units})")
+                
+                if len(available_data_elements_meta) > 10:
+                    metadata_info.append(f"  *... e mais {len(available_data_elements_meta) - 10} elementos*")
                 
                 # Filtros/facets disponíveis
                 facets_meta = response_content.get('facets', [])
@@ -439,19 +1035,12 @@ specific_route: "rota-escolhida"
                 if frequencies:
                     freq_list = []
                     for freq in frequencies:
-                        freq_id = freq.get('id', freq.get('query', 'N/A'))
-                        freq_desc = freq.get('description', freq.get('name', ''))
+                        freq_id = freq.get('id') or freq.get('query') or 'N/A'
+                        freq_desc = freq.get('description') or freq.get('name') or ''
                         freq_list.append(f"`{freq_id}`" + (f" ({freq_desc})" if freq_desc else ""))
                     metadata_info.append(f"\n📅 **Frequências**: {', '.join(freq_list)}")
                 
-                metadata_info.append(f"""
-🎯 **Para obter dados reais**, chame novamente especificando:
-data_elements: ["value"] # ou outros elementos disponíveis
-facets: {{"filtro": ["valor"]}} # opcional
-frequency: "monthly" # opcional
-start_period: "2020" # opcional
-end_period: "2023" # opcional
-                """)
+                metadata_info.append(DATA_REQUEST_HINT)
                 
                 return CallToolResult(
                     content=[TextContent(type="text", text="\n".join(metadata_info))]
@@ -476,30 +1065,14 @@ end_period: "2023" # opcional
 
         # --- FIM DA LÓGICA DE TRATAMENTO DE ELEMENTOS DE DADOS ---
 
-        # Fase 4: Recuperar dados reais
-        data_route = f"{specific_route.rstrip('/')}/data"
-        params = {
-            "length": min(limit, 5000),
-            "offset": 0
-        }
-        
-        # Adicionar parâmetros
-        if elements_to_fetch: # Usa os elementos determinados, seja pelo usuário ou por padrão
-            params["data"] = elements_to_fetch
-        if frequency:
-            params["frequency"] = frequency
-        if start_period:
-            params["start"] = start_period
-        if end_period:
-            params["end"] = end_period
-        if facets and any(facets.values()):
-            params["facets"] = facets
-        if sort_column:
-            params["sort"] = [{"column": sort_column, "direction": sort_direction}]
-        
-        logger.info(f"Requisitando dados de: {data_route}")
-        data_response = await make_eia_api_request(data_route, params, use_cache=False)
-        
+        # Fase 4: Recuperar dados reais (já em andamento se data_elements foi informado)
+        if data_task is not None:
+            data_response = await data_task
+        else:
+            params["data"] = elements_to_fetch  # 'value' assumido por padrão
+            logger.info(f"Requisitando dados de: {data_route}")
+            data_response = await make_eia_api_request(data_route, params)
+
         if not data_response:
             return CallToolResult(
                 is_error=True, 
@@ -508,10 +1081,10 @@ end_period: "2023" # opcional
         
         if data_response.get("error"):
             error_details = []
-            error_details.append(f"❌ **Erro ao recuperar dados**: {data_response.get('message', 'Erro desconhecido')}")
+            error_details.append(f"❌ **Erro ao recuperar dados**: {truncate_text(data_response.get('message', 'Erro desconhecido'))}")
             
             if data_response.get("data"):
-                error_details.append(f"**Detalhes**: {data_response.get('data')}")
+                error_details.append(f"**Detalhes**: {truncate_text(data_response.get('data'))}")
             
             # Sugestões baseadas no erro
             error_msg = str(data_response.get('message', '')).lower()
@@ -533,22 +1106,14 @@ end_period: "2023" # opcional
         actual_data = response_data.get('data', [])
         
         if not actual_data:
-            suggestion_text = f"""
-❌ **Nenhum dado encontrado** para os critérios especificados.
-
-**Parâmetros utilizados**:
-- Rota: `{data_route}`
-- Elementos: `{elements_to_fetch}`
-- Filtros: `{facets}`
-- Frequência: `{frequency}`
-- Período: `{start_period}` até `{end_period}`
-
-💡 **Sugestões**:
-1. Tente ampliar o período de tempo
-2. Remova alguns filtros específicos
-3. Verifique se os valores dos filtros estão corretos
-4. Use a ferramenta `get_facet_values()` para ver opções válidas
-            """
+            suggestion_text = NO_DATA_TEMPLATE.format(
+                data_route=data_route,
+                elements_to_fetch=elements_to_fetch,
+                facets=facets,
+                frequency=frequency,
+                start_period=start_period,
+                end_period=end_period
+            )
             return CallToolResult(
                 content=[TextContent(type="text", text=suggestion_text)]
             )
@@ -566,7 +1131,7 @@ end_period: "2023" # opcional
             total_records = len(actual_data)
         
         output_lines = [
-            f"📊 **Dados de Energia**: {response_content.get('name', specific_route)}",
+            f"📊 **Dados de Energia**: {route_name or specific_route}",
             f"🔍 **Consulta**: {query}",
             f"📈 **Total de registros**: {total_records:,} (mostrando {len(actual_data):,})",
         ]
@@ -597,8 +1162,8 @@ end_period: "2023" # opcional
         output_lines.extend(format_data_table(actual_data, max_rows=50))
         
         # Informações adicionais
-        if response_content.get('description'):
-            output_lines.append(f"\n📝 **Sobre os dados**: {response_content['description']}")
+        if route_description:
+            output_lines.append(f"\n📝 **Sobre os dados**: {route_description}")
         
         if total_records > len(actual_data):
             output_lines.append(f"\n⚠️ **Dados paginados**: Use `limit` maior ou implemente paginação para ver todos os {total_records:,} registros")
@@ -613,6 +1178,10 @@ end_period: "2023" # opcional
             is_error=True,
             content=[TextContent(type="text", text=f"❌ Erro inesperado: {str(e)}")]
         )
+    finally:
+        # Rota com sub-rotas, erro nos metadados ou elemento inválido: a busca antecipada é descartada
+        if data_task is not None and not data_task.done():
+            data_task.cancel()
 
 @mcp.tool()
 async def get_facet_values(route: str, facet_id: str, limit: int = 100) -> CallToolResult:
@@ -644,7 +1213,9 @@ async def get_facet_values(route: str, facet_id: str, limit: int = 100) -> CallT
                 content=[TextContent(type="text", text=f"❌ Nenhum valor encontrado para o filtro '{facet_id}' na rota '{route}'.")]
             )
         
-        total_facets = response_content.get('totalFacets', len(facet_values))
+        total_facets = response_content.get('totalFacets')
+        if total_facets is None:
+            total_facets = len(facet_values)
         
         output_lines = [
             f"🔍 **Valores disponíveis para o filtro `{facet_id}`**",
@@ -671,12 +1242,9 @@ async def get_facet_values(route: str, facet_id: str, limit: int = 100) -> CallT
             output_lines.append(f"\n⚠️ **Mostrando apenas {len(facet_values)} de {total_facets} valores**. Use `limit` maior para ver mais.")
         
         # Exemplo de uso
-        output_lines.append(f"""
-💡 **Exemplo de uso**:
-```
-facets: {{"{facet_id}": ["{facet_values[0].get('id', 'VALUE')}"]}}
-```
-        """)
+        output_lines.append(FACET_EXAMPLE_TEMPLATE.format(
+            facet_id=facet_id, example_value=facet_values[0].get('id', 'VALUE')
+        ))
         
         return CallToolResult(
             content=[TextContent(type="text", text="\n".join(output_lines))]
@@ -709,7 +1277,7 @@ async def get_series_data(series_id: str, start: Optional[str] = None, end: Opti
         if end:
             params["end"] = end
         
-        response = await make_eia_api_request(series_route, params, use_cache=False)
+        response = await make_eia_api_request(series_route, params)
         
         if not response or response.get("error"):
             error_msg = response.get('message', 'Erro desconhecido') if response else 'Sem resposta'
@@ -726,8 +1294,8 @@ async def get_series_data(series_id: str, start: Optional[str] = None, end: Opti
                 content=[TextContent(type="text", text=f"❌ Nenhum dado encontrado para a série '{series_id}' no período especificado.")]
             )
         
-        # Obter metadados da série
-        series_info = series_data[0] if series_data else {}
+        # Obter metadados da série (series_data já garantido não vazio acima)
+        series_info = series_data[0]
         series_name = series_info.get('name', series_id)
         series_description = series_info.get('description', '')
         series_units = series_info.get('units', 'N/A')
@@ -750,22 +1318,17 @@ async def get_series_data(series_id: str, start: Optional[str] = None, end: Opti
         output_lines.append("")  # Linha em branco
         
         if data_points:
-            # Formatar dados como tabela
-            formatted_data = []
-            for point in data_points:
-                if len(point) >= 2:
-                    period = point[0]
-                    value = point[1]
-                    # Formatação especial para valores numéricos
-                    if isinstance(value, (int, float)) and abs(value) >= 1000:
-                        formatted_value = f"{value:,.2f}" if isinstance(value, float) else f"{value:,}"
-                    else:
-                        formatted_value = str(value)
-                    formatted_data.append({"Período": period, "Valor": formatted_value, "Unidade": series_units})
+            # Só os pontos exibidos viram linhas da tabela (a série pode ter milhares);
+            # a formatação numérica fica a cargo de format_cell_value
+            displayed_points = islice((point for point in data_points if len(point) >= 2), 50)
+            formatted_data = [
+                {"Período": point[0], "Valor": point[1], "Unidade": series_units}
+                for point in displayed_points
+            ]
             
             # Mostrar tabela
             if formatted_data:
-                output_lines.extend(format_data_table(formatted_data[:50]))
+                output_lines.extend(format_data_table(formatted_data))
                 
                 if len(data_points) > 50:
                     output_lines.append(f"\n*Mostrando 50 de {len(data_points)} registros*")
@@ -808,9 +1371,10 @@ async def discover_energy_routes(category: Optional[str] = None) -> CallToolResu
         
         # Filtrar por categoria se especificada
         if category:
-            filtered_routes = [r for r in routes_data if category.lower() in r.get('id', '').lower()]
+            category_lower = category.lower()  # normalizada uma vez, não a cada rota
+            filtered_routes = [r for r in routes_data if category_lower in r.get('id', '').lower()]
             if not filtered_routes:
-                available_categories = list(set([r.get('id', '').split('/')[0] for r in routes_data if '/' not in r.get('id', '')]))
+                available_categories = {r.get('id', '').split('/')[0] for r in routes_data if '/' not in r.get('id', '')}
                 return CallToolResult(
                     content=[TextContent(type="text", text=f"❌ Categoria '{category}' não encontrada.\n\n📂 **Categorias disponíveis**: {', '.join(sorted(available_categories))}")]
                 )
@@ -830,16 +1394,13 @@ async def discover_energy_routes(category: Optional[str] = None) -> CallToolResu
             route_desc = route.get('description', '')
             
             # Determinar categoria principal
-            main_category = route_id.split('/')[0] if '/' in route_id else route_id
-            
-            if main_category not in categories:
-                categories[main_category] = []
+            main_category = route_id.partition('/')[0]
             
             route_info = f"  • **{route_id}**: {route_name}"
             if route_desc:
                 route_info += f"\n    ↳ _{route_desc}_"
             
-            categories[main_category].append(route_info)
+            categories.setdefault(main_category, []).append(route_info)
         
         # Mostrar categorias organizadas
         for cat_name, cat_routes in sorted(categories.items()):
@@ -851,14 +1412,7 @@ async def discover_energy_routes(category: Optional[str] = None) -> CallToolResu
             
             output_lines.append("")  # Linha em branco entre categorias
         
-        output_lines.append("""
-💡 **Próximos passos**:
-1. Use `search_energy_data()` com uma rota específica
-2. Use `get_facet_values()` para ver filtros disponíveis
-3. Use `get_series_data()` se tiver um ID de série específico
-
-**Exemplo**: `search_energy_data(specific_route="electricity/retail-sales")`
-        """)
+        output_lines.append(NEXT_STEPS_TEXT)
         
         return CallToolResult(
             content=[TextContent(type="text", text="\n".join(output_lines))]
@@ -871,54 +1425,43 @@ async def discover_energy_routes(category: Optional[str] = None) -> CallToolResu
             content=[TextContent(type="text", text=f"❌ Erro inesperado: {str(e)}")]
         )
 
+@mcp.tool()
+async def clear_eia_cache() -> CallToolResult:
+    """
+    Limpa os caches de metadados e dados da EIA, forçando novas consultas à API.
+    
+    Útil quando a EIA publicou dados novos antes de o cache expirar.
+    """
+    global cache_generation
+    metadata_entries = len(metadata_cache)
+    data_entries = len(data_cache)
+    # Buscas em andamento terminam normalmente para quem as aguarda, mas não regravam o cache
+    cache_generation += 1
+    inflight_requests.clear()
+    metadata_cache.clear()
+    data_cache.clear()
+    prefetch_failures.clear()
+    disk_entries = clear_disk_cache()
+    logger.info(f"Cache limpo: {metadata_entries} metadados, {data_entries} dados, {disk_entries} em disco")
+    
+    return CallToolResult(
+        content=[TextContent(type="text", text=f"🧹 **Cache limpo**: {metadata_entries} metadados, {data_entries} respostas de dados e {disk_entries} entradas em disco removidas.")]
+    )
+
 # --- Recursos (Resources) ---
+# Conteúdo estático: o Resource é montado uma única vez no import
+ENERGY_CONCEPTS_RESOURCE = Resource(
+    uri="eia://energy-concepts",
+    name="Conceitos Energéticos EIA",
+    description="Mapeamento de conceitos energéticos e palavras-chave para descoberta automática de rotas",
+    mimeType="text/markdown",
+    text=ENERGY_CONCEPTS_TEXT
+)
+
 @mcp.resource("eia://energy-concepts")
 async def get_energy_concepts() -> Resource:
     """Retorna informações sobre conceitos energéticos e mapeamento de palavras-chave."""
-    concepts_text = """# Conceitos Energéticos - EIA
-
-## Mapeamento de Conceitos
-
-### Eletricidade
-- **Palavras-chave**: eletricidade, energia elétrica, consumo energia, geração energia, preço energia, electricity, power, grid
-- **Rotas principais**: electricity, electricity/retail-sales, electricity/electric-power-operational-data
-
-### Petróleo
-- **Palavras-chave**: petróleo, gasolina, diesel, crude oil, combustível, refino, petroleum, oil, gasoline, refineries
-- **Rotas principais**: petroleum, petroleum/crd/crpdn, petroleum/supply/weekly
-
-### Gás Natural
-- **Palavras-chave**: gás natural, gas natural, lng, pipeline, natural gas, methane
-- **Rotas principais**: natural-gas, natural-gas/prod, natural-gas/cons
-
-### Carvão
-- **Palavras-chave**: carvão, coal, mineração carvão, carbon, mining
-- **Rotas principais**: coal, coal/production, coal/consumption
-
-### Energias Renováveis
-- **Palavras-chave**: renovável, solar, eólica, hidráulica, biomassa, renewable, wind, hydro, geothermal
-- **Rotas principais**: electricity/electric-power-operational-data, renewable
-
-### Nuclear
-- **Palavras-chave**: nuclear, uranium, reactor, nuclear power
-- **Rotas principais**: nuclear, nuclear/fuel-cycle
-
-### Energia Total
-- **Palavras-chave**: energia total, consumo total, balanço energético, total energy, energy balance
-- **Rotas principais**: total-energy, total-energy/data
-
-### Internacional
-- **Palavras-chave**: internacional, world, global, countries, export, import
-- **Rotas principais**: international
-"""
-    
-    return Resource(
-        uri="eia://energy-concepts",
-        name="Conceitos Energéticos EIA",
-        description="Mapeamento de conceitos energéticos e palavras-chave para descoberta automática de rotas",
-        mimeType="text/markdown",
-        text=concepts_text
-    )
+    return ENERGY_CONCEPTS_RESOURCE
 
 # --- Prompts ---
 @mcp.prompt()
@@ -937,41 +1480,23 @@ async def energy_analysis_prompt(
         time_period: Período temporal (ex: "recent", "2020-2023", "historical")
         analysis_type: Tipo de análise (ex: "overview", "trends", "comparison", "forecast")
     """
-    
-    prompt_text = f"""# Análise de Dados Energéticos - {topic.title()}
-
-## Contexto da Análise
-- **Tópico**: {topic}
-- **Escopo Geográfico**: {geographic_scope}
-- **Período**: {time_period}
-- **Tipo de Análise**: {analysis_type}
+    return build_energy_analysis_prompt(topic, geographic_scope, time_period, analysis_type)
 
-## Objetivos da Análise
-1. Identificar tendências principais nos dados de {topic}
-2. Analisar padrões sazonais ou cíclicos
-3. Comparar diferentes regiões/setores quando aplicável
-4. Identificar fatores que influenciam as variações
-5. Fornecer insights acionáveis
-
-## Passos Recomendados
-1. **Descoberta de Dados**: Use `search_energy_data()` para encontrar dados relevantes sobre {topic}
-2. **Exploração**: Examine metadados e filtros disponíveis
-3. **Coleta**: Obtenha dados específicos com parâmetros adequados
-4. **Análise**: Identifique padrões, tendências e anomalias
-5. **Interpretação**: Contextualize os resultados com fatores externos
-
-## Considerações Especiais
-- Atenção a unidades de medida e conversões
-- Verificação de dados sazonalmente ajustados vs. não ajustados
-- Comparação com benchmarks históricos
-- Impacto de eventos externos (crises, políticas, clima)
-
-## Formato de Resultado Esperado
-- Resumo executivo dos principais achados
-- Visualizações ou tabelas dos dados chave
-- Análise de tendências com explicações
-- Recomendações ou insights para tomada de decisão
-"""
+@lru_cache(maxsize=256)
+def build_energy_analysis_prompt(
+    topic: str,
+    geographic_scope: str,
+    time_period: str,
+    analysis_type: str
+) -> GetPromptResult:
+    """Monta o prompt de análise; o resultado depende só dos argumentos e fica em cache."""
+    prompt_text = ENERGY_ANALYSIS_PROMPT_TEMPLATE.format(
+        topic_title=topic.title(),
+        topic=topic,
+        geographic_scope=geographic_scope,
+        time_period=time_period,
+        analysis_type=analysis_type
+    )
     
     return GetPromptResult(
         name=f"energy_analysis_{topic.replace(' ', '_')}",
@@ -982,13 +1507,52 @@ async def energy_analysis_prompt(
     )
 
 # --- Execução do Servidor ---
+# Categorias cujos metadados são carregados logo após a verificação inicial
+PREWARM_ROUTES = ["electricity", "petroleum", "natural-gas"]
+
+async def probe_eia_api(timeout: float = 5.0) -> None:
+    """Verifica a conexão com a API da EIA e registra o resultado no log."""
+    try:
+        test_response = await asyncio.wait_for(make_eia_api_request(""), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ API da EIA não respondeu em {timeout:.0f}s na verificação inicial")
+        return
+    if test_response and not test_response.get("error"):
+        logger.info("✅ Conexão com a API da EIA verificada")
+        # Aquece o cache das categorias mais consultadas numa única rajada paralela
+        await warm_metadata_cache(PREWARM_ROUTES)
+    else:
+        error_msg = test_response.get("message", "Erro desconhecido") if test_response else "Sem resposta"
+        logger.warning(f"⚠️ Falha na verificação da API da EIA: {error_msg}")
+
+async def main() -> None:
+    """Executa o servidor MCP (SSE) e libera cliente HTTP, cache em disco e log em arquivo ao encerrar."""
+    # Verificação em segundo plano: o servidor começa a aceitar conexões sem esperar a EIA.
+    # Sem chave não há o que verificar (o aviso já foi registrado no import)
+    if EIA_API_KEY:
+        probe_task = asyncio.create_task(probe_eia_api())
+        background_tasks.add(probe_task)
+        probe_task.add_done_callback(background_tasks.discard)
+    try:
+        await mcp.run_sse_async()
+    finally:
+        await close_http_client()
+        close_disk_cache()
+        if log_listener is not None:
+            log_listener.stop()
+
 if __name__ == "__main__":
     logger.info(f"🚀 Iniciando EIA Energy Data MCP Server v2.1 na porta {PORT}")
     logger.info(f"🔑 API Key configurada: {'✅' if EIA_API_KEY else '❌'}")
     logger.info(f"📊 Conceitos mapeados: {len(CONCEPT_MAPPING)}")
-    
+    logger.info(f"🔄 Loop de eventos: {'uvloop' if uvloop is not None else 'asyncio'}")
+    logger.info(f"🌐 HTTP/2: {'✅' if HTTP2_AVAILABLE else '❌ (instale httpx[http2])'}")
+
     try:
-        mcp.run(transport="sse")
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("🛑 Servidor interrompido pelo usuário")
     except Exception as e:
@@ -0,0 +1,489 @@
+"""Testes da camada de requisições e cache do eia_server, com a API da EIA simulada via httpx.MockTransport."""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+import httpx
+
+os.environ.setdefault("EIA_API_KEY", "test-key")
+# Cache em disco e pré-carregamento ficam desligados; os testes que precisam os ativam
+os.environ["EIA_CACHE_DIR"] = ""
+os.environ["EIA_PREFETCH_SUBROUTES"] = "0"
+# Respostas de erro simuladas geram logs de erro esperados; defina EIA_LOG_LEVEL para vê-los
+os.environ.setdefault("EIA_LOG_LEVEL", "CRITICAL")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import eia_server  # noqa: E402
+
+
+class EIARequestTestCase(unittest.IsolatedAsyncioTestCase):
+    """Base: cliente HTTP simulado e caches vazios a cada teste."""
+
+    def setUp(self):
+        self.requests = []
+        eia_server.metadata_cache.clear()
+        eia_server.data_cache.clear()
+        eia_server.inflight_requests.clear()
+        eia_server.close_disk_cache()
+        eia_server.disk_cache_enabled = False
+
+    async def asyncSetUp(self):
+        eia_server.http_client = httpx.AsyncClient(
+            base_url=eia_server.EIA_API_BASE_URL,
+            params={"api_key": eia_server.EIA_API_KEY},
+            transport=httpx.MockTransport(self.handle)
+        )
+
+    async def asyncTearDown(self):
+        await eia_server.close_http_client()
+        eia_server.close_disk_cache()
+        eia_server.disk_cache_enabled = False
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return self.respond(request)
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        """Resposta padrão; os testes substituem conforme o cenário."""
+        return httpx.Response(200, json={"response": {"id": request.url.path}}, request=request)
+
+    def enable_disk_cache(self) -> None:
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        eia_server.EIA_CACHE_DIR = cache_dir.name
+        eia_server.disk_cache_enabled = True
+
+    def expire_metadata(self) -> None:
+        """Envelhece as entradas de metadados (memória e disco) além de EIA_META_TTL."""
+        age = eia_server.cache_ttl + 1
+        for entry in eia_server.metadata_cache.values():
+            entry['timestamp'] -= age
+        db = eia_server.get_disk_cache()
+        if db is not None:
+            db.execute("UPDATE metadata SET timestamp = timestamp - ?", (age,))
+
+
+class MemoryCacheTests(EIARequestTestCase):
+    """Cache de metadados em memória: TTL, LRU e respostas com erro."""
+
+    async def test_cached_until_ttl_expires(self):
+        first = await eia_server.make_eia_api_request("electricity")
+        second = await eia_server.make_eia_api_request("electricity")
+        self.assertIs(second, first)
+        self.assertEqual(len(self.requests), 1)
+
+        self.expire_metadata()
+        await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(len(self.requests), 2)
+        # Sem validadores, a entrada expirada é descartada e a nova busca é incondicional
+        self.assertIsNone(self.requests[1].headers.get("if-none-match"))
+
+    async def test_least_recently_used_entry_is_evicted(self):
+        with unittest.mock.patch.object(eia_server, "cache_max_entries", 2):
+            await eia_server.make_eia_api_request("electricity")
+            await eia_server.make_eia_api_request("petroleum")
+            await eia_server.make_eia_api_request("electricity")  # acerto: passa a ser a mais recente
+            await eia_server.make_eia_api_request("coal")  # remove petroleum
+            await eia_server.make_eia_api_request("electricity")
+            await eia_server.make_eia_api_request("petroleum")
+
+        self.assertEqual(
+            [r.url.path for r in self.requests],
+            ["/v2/electricity", "/v2/petroleum", "/v2/coal", "/v2/petroleum"]
+        )
+        self.assertEqual(len(eia_server.metadata_cache), 2)
+
+    async def test_error_responses_are_not_cached(self):
+        self.respond = lambda request: httpx.Response(404, json={"error": "not found"}, request=request)
+
+        await eia_server.make_eia_api_request("missing")
+        await eia_server.make_eia_api_request("missing")
+
+        self.assertEqual(len(self.requests), 2)
+
+
+class SingleflightTests(EIARequestTestCase):
+    """Chamadas concorrentes para a mesma chave compartilham uma única requisição."""
+
+    async def test_concurrent_calls_share_one_request(self):
+        async def respond(request):
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"response": {"id": "electricity"}}, request=request)
+
+        self.respond = respond
+        results = await asyncio.gather(*(eia_server.make_eia_api_request("electricity") for _ in range(5)))
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(eia_server.inflight_requests, {})
+
+
+class RetryTests(EIARequestTestCase):
+    """Novas tentativas em 429/502/503 e falhas de conexão."""
+
+    def setUp(self):
+        super().setUp()
+        self.responses = []
+        patcher = unittest.mock.patch("asyncio.sleep", new_callable=unittest.mock.AsyncMock)
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Semáforo de uma vaga, para registrar se ela está ocupada durante cada espera
+        patcher = unittest.mock.patch.object(eia_server, "eia_request_semaphore", asyncio.Semaphore(1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.slots_held = []
+        self.sleep.side_effect = lambda delay: self.slots_held.append(eia_server.eia_request_semaphore.locked())
+
+    def respond(self, request):
+        response = self.responses.pop(0) if self.responses else httpx.Response(200, json={"response": {}})
+        if isinstance(response, Exception):
+            raise response
+        response.request = request
+        return response
+
+    def delays(self):
+        return [call.args[0] for call in self.sleep.await_args_list]
+
+    async def test_429_is_retried_with_exponential_delay(self):
+        self.responses = [httpx.Response(429), httpx.Response(429)]
+
+        result = await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(result, {"response": {}})
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(self.delays(), [1.0, 2.0])
+
+    def assert_slot_free_during_backoff(self):
+        # A espera acontece fora do semáforo: a única vaga fica livre para outras chamadas
+        self.assertTrue(self.sleep.await_args_list)
+        self.assertEqual(self.slots_held, [False] * len(self.sleep.await_args_list))
+
+    async def test_429_backoff_releases_the_semaphore_slot(self):
+        self.responses = [httpx.Response(429), httpx.Response(429)]
+
+        await eia_server.make_eia_api_request("electricity")
+
+        self.assert_slot_free_during_backoff()
+
+    async def test_retry_after_header_sets_the_delay(self):
+        self.responses = [httpx.Response(503, headers={"Retry-After": "7"})]
+
+        await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(self.delays(), [7.0])
+
+    async def test_retry_after_and_connection_backoff_release_the_semaphore_slot(self):
+        self.responses = [httpx.Response(503, headers={"Retry-After": "30"}), httpx.ConnectError("recusada")]
+
+        await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(self.delays(), [30.0, 2.0])
+        self.assert_slot_free_during_backoff()
+
+    async def test_retry_after_is_capped(self):
+        self.responses = [httpx.Response(429, headers={"Retry-After": "3600"})]
+
+        await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(self.delays(), [eia_server.MAX_RETRY_DELAY])
+
+    async def test_gives_up_after_max_retries(self):
+        self.responses = [httpx.Response(502) for _ in range(eia_server.EIA_MAX_RETRIES + 1)]
+
+        result = await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(len(self.requests), eia_server.EIA_MAX_RETRIES + 1)
+        self.assertEqual(result["error"], "HTTPStatusError: 502")
+
+    async def test_connection_error_is_retried(self):
+        self.responses = [httpx.ConnectError("recusada")]
+
+        result = await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(result, {"response": {}})
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_read_timeout_is_not_retried(self):
+        self.responses = [httpx.ReadTimeout("lenta")]
+
+        result = await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(result["error"], "RequestError")
+        self.assertEqual(len(self.requests), 1)
+
+
+class RetryConcurrencyTests(EIARequestTestCase):
+    """Uma requisição aguardando nova tentativa não bloqueia as demais."""
+
+    async def test_other_calls_proceed_during_backoff(self):
+        backoff = asyncio.Event()
+
+        def respond(request):
+            if request.url.path.endswith("/slow") and not backoff.is_set():
+                backoff.set()
+                return httpx.Response(503, headers={"Retry-After": "60"}, request=request)
+            return httpx.Response(200, json={"response": {}}, request=request)
+
+        self.respond = respond
+        with unittest.mock.patch.object(eia_server, "eia_request_semaphore", asyncio.Semaphore(1)):
+            slow = asyncio.create_task(eia_server.make_eia_api_request("electricity/slow"))
+            await backoff.wait()
+            # A única vaga está livre enquanto a outra requisição espera os 60s do Retry-After
+            result = await asyncio.wait_for(eia_server.make_eia_api_request("electricity"), 1)
+            slow.cancel()
+
+        self.assertEqual(result, {"response": {}})
+
+
+class DiskCacheTests(EIARequestTestCase):
+    """Cache de metadados em disco (SQLite)."""
+
+    async def test_round_trip_after_restart(self):
+        self.enable_disk_cache()
+        first = await eia_server.make_eia_api_request("electricity")
+        eia_server.metadata_cache.clear()
+
+        second = await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_data_routes_are_not_written_to_disk(self):
+        self.enable_disk_cache()
+        await eia_server.make_eia_api_request("electricity/retail-sales/data", {"length": 1})
+
+        self.assertEqual(eia_server.get_disk_cache().execute("SELECT COUNT(*) FROM metadata").fetchone()[0], 0)
+
+    async def test_corrupt_row_is_discarded(self):
+        self.enable_disk_cache()
+        eia_server.get_disk_cache().execute(
+            "INSERT INTO metadata (key, data, timestamp) VALUES (?, ?, ?)",
+            (eia_server.make_cache_key("electricity", {}), b'{"response": {"id"', eia_server.datetime.now().timestamp())
+        )
+
+        result = await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(result, {"response": {"id": "/v2/electricity"}})
+        self.assertEqual(len(self.requests), 1)
+        # A busca regrava a entrada com a resposta válida
+        self.assertEqual(eia_server.load_disk_metadata(eia_server.make_cache_key("electricity", {}))['data'], result)
+
+    def test_legacy_table_gains_validator_columns(self):
+        self.enable_disk_cache()
+        legacy = sqlite3.connect(os.path.join(eia_server.EIA_CACHE_DIR, "metadata.sqlite3"))
+        legacy.execute("CREATE TABLE metadata (key TEXT PRIMARY KEY, data BLOB NOT NULL, timestamp REAL NOT NULL)")
+        legacy.commit()
+        legacy.close()
+
+        eia_server.save_disk_metadata("electricity_{}", {"response": {}}, '"v1"', None)
+
+        self.assertEqual(eia_server.load_disk_metadata("electricity_{}")['etag'], '"v1"')
+
+
+class ConditionalRequestTests(EIARequestTestCase):
+    """Revalidação de metadados expirados com ETag (304)."""
+
+    def respond(self, request):
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, request=request)
+        return httpx.Response(200, json={"response": {"id": "electricity"}}, headers={"ETag": '"v1"'}, request=request)
+
+    async def assert_revalidated(self):
+        first = await eia_server.make_eia_api_request("electricity")
+        self.expire_metadata()
+        second = await eia_server.make_eia_api_request("electricity")
+        third = await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual([r.headers.get("if-none-match") for r in self.requests], [None, '"v1"'])
+        # 304: o mesmo dicionário já decodificado é reaproveitado e volta a ser válido
+        self.assertIs(second, first)
+        self.assertIs(third, first)
+
+    async def test_expired_entry_is_revalidated(self):
+        await self.assert_revalidated()
+
+    async def test_expired_entry_is_revalidated_with_disk_cache(self):
+        self.enable_disk_cache()
+        await self.assert_revalidated()
+
+    async def test_disk_entry_keeps_validators_after_restart(self):
+        self.enable_disk_cache()
+        await eia_server.make_eia_api_request("electricity")
+        # Simula reinício: memória vazia, entrada em disco além de EIA_META_TTL
+        eia_server.metadata_cache.clear()
+        self.expire_metadata()
+
+        result = await eia_server.make_eia_api_request("electricity")
+
+        self.assertEqual(result, {"response": {"id": "electricity"}})
+        self.assertEqual([r.headers.get("if-none-match") for r in self.requests], [None, '"v1"'])
+        entry = eia_server.load_disk_metadata(next(iter(eia_server.metadata_cache)))
+        self.assertEqual(entry['etag'], '"v1"')
+        self.assertLess(eia_server.datetime.now().timestamp() - entry['timestamp'], eia_server.cache_ttl)
+
+
+class PrefetchTests(EIARequestTestCase):
+    """Pré-carregamento das sub-rotas listadas."""
+
+    def setUp(self):
+        super().setUp()
+        eia_server.prefetch_failures.clear()
+        patcher = unittest.mock.patch.object(eia_server, "EIA_PREFETCH_SUBROUTES", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def respond(self, request):
+        return httpx.Response(404, json={"error": "not found"}, request=request)
+
+    async def prefetch(self, route_paths):
+        eia_server.prefetch_route_metadata(route_paths)
+        await asyncio.gather(*eia_server.background_tasks)
+
+    async def test_failed_routes_are_not_prefetched_again(self):
+        route_paths = [f"electricity/route-{i}" for i in range(3)]
+        await self.prefetch(route_paths)
+        await self.prefetch(route_paths)
+
+        self.assertEqual(len(self.requests), 3)
+
+    async def test_trailing_slash_route_prefetches_normalized_subroutes(self):
+        def respond(request):
+            if request.url.path == "/v2/electricity":
+                return httpx.Response(200, json={"response": {"routes": [{"id": "retail-sales"}]}}, request=request)
+            return httpx.Response(200, json={"response": {"id": "retail-sales"}}, request=request)
+
+        self.respond = respond
+        await eia_server.search_energy_data("q", specific_route="electricity/")
+        await asyncio.gather(*eia_server.background_tasks)
+
+        self.assertEqual([r.url.path for r in self.requests], ["/v2/electricity", "/v2/electricity/retail-sales"])
+        self.assertIsNotNone(eia_server.get_cached_metadata(eia_server.make_cache_key("electricity/retail-sales", {})))
+
+    async def test_prefetch_leaves_semaphore_slots_free(self):
+        await self.prefetch([f"electricity/route-{i}" for i in range(20)])
+
+        self.assertEqual(len(self.requests), eia_server.EIA_MAX_CONCURRENCY // 2)
+
+
+class DiscoverRoutesTests(EIARequestTestCase):
+    """discover_energy_routes filtra o catálogo raiz sem buscas adicionais."""
+
+    def respond(self, request):
+        routes = [{"id": "electricity", "name": "Electricity"}, {"id": "petroleum", "name": "Petroleum"}]
+        return httpx.Response(200, json={"response": {"routes": routes}}, request=request)
+
+    async def test_category_filter_makes_only_the_root_request(self):
+        result = await eia_server.discover_energy_routes(category="e")
+
+        self.assertEqual([r.url.path for r in self.requests], ["/v2/"])
+        self.assertIn("**electricity**", result.content[0].text)
+        self.assertIn("**petroleum**", result.content[0].text)
+
+
+class ClearCacheTests(EIARequestTestCase):
+    """clear_eia_cache com buscas em andamento."""
+
+    async def test_inflight_response_is_not_stored_after_clear(self):
+        self.enable_disk_cache()
+        release = asyncio.Event()
+
+        async def respond(request):
+            await release.wait()
+            return httpx.Response(200, json={"response": {"id": "electricity"}}, request=request)
+
+        self.respond = respond
+        pending = asyncio.create_task(eia_server.make_eia_api_request("electricity"))
+        while not self.requests:
+            await asyncio.sleep(0)
+
+        await eia_server.clear_eia_cache()
+        release.set()
+        result = await pending
+
+        # Quem aguardava recebe a resposta, mas ela não volta ao cache
+        self.assertEqual(result, {"response": {"id": "electricity"}})
+        self.assertEqual(len(eia_server.metadata_cache), 0)
+        self.assertEqual(eia_server.inflight_requests, {})
+        self.assertIsNone(eia_server.load_disk_metadata(eia_server.make_cache_key("electricity", {})))
+
+
+class SpeculativeDataRequestTests(EIARequestTestCase):
+    """Busca antecipada dos dados em search_energy_data quando data_elements é informado."""
+
+    def respond(self, request):
+        path = request.url.path.removeprefix("/v2/")
+        if path == "electricity":
+            return httpx.Response(200, json={"response": {"id": "electricity", "routes": [{"id": "retail-sales"}]}}, request=request)
+        if path == "electricity/retail-sales":
+            return httpx.Response(200, json={"response": {"id": "retail-sales", "data": {"sales": {}}}}, request=request)
+        if path == "electricity/data":
+            # Rota com sub-rotas: a EIA responde erro, que não entra no cache
+            return httpx.Response(400, json={"error": "invalid route"}, request=request)
+        if path.endswith("/data"):
+            return httpx.Response(200, json={"response": {"total": 1, "data": [{"period": "2023", "sales": 1}]}}, request=request)
+        return httpx.Response(404, json={"error": "not found"}, request=request)
+
+    def data_requests(self):
+        return [r for r in self.requests if r.url.path.endswith("/data")]
+
+    async def test_leaf_route_data_is_fetched_once_and_cached(self):
+        first = await eia_server.search_energy_data("q", specific_route="electricity/retail-sales", data_elements=["sales"])
+        second = await eia_server.search_energy_data("q", specific_route="electricity/retail-sales", data_elements=["sales"])
+
+        # is_error não é um campo de CallToolResult (fica sempre False): verifica o texto
+        self.assertIn("| period | sales |", first.content[0].text)
+        self.assertNotIn("❌", first.content[0].text)
+        self.assertEqual(first.content[0].text, second.content[0].text)
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_parent_route_is_not_speculated_once_metadata_is_cached(self):
+        for _ in range(3):
+            result = await eia_server.search_energy_data("q", specific_route="electricity", data_elements=["sales"])
+            self.assertIn("retail-sales", result.content[0].text)
+        # Dá chance a buscas deixadas em segundo plano de rodarem
+        await asyncio.sleep(0.01)
+
+        # No máximo a busca da primeira chamada, quando ainda não se sabia que a rota tem sub-rotas
+        self.assertLessEqual(len(self.data_requests()), 1)
+
+    async def test_discovered_route_is_not_speculated(self):
+        result = await eia_server.search_energy_data("electricity", data_elements=["sales"])
+        # Dá chance a buscas deixadas em segundo plano de rodarem
+        await asyncio.sleep(0.01)
+
+        self.assertIn("retail-sales", result.content[0].text)
+        self.assertEqual(self.data_requests(), [])
+
+    async def test_speculative_response_is_not_stored_after_clear(self):
+        release = asyncio.Event()
+        respond = self.respond
+
+        async def delayed_data(request):
+            if request.url.path.endswith("/data"):
+                await release.wait()
+            return respond(request)
+
+        self.respond = delayed_data
+        pending = asyncio.create_task(
+            eia_server.search_energy_data("q", specific_route="electricity/retail-sales", data_elements=["sales"])
+        )
+        while not self.data_requests():
+            await asyncio.sleep(0)
+
+        await eia_server.clear_eia_cache()
+        release.set()
+        result = await pending
+
+        # Quem chamou recebe os dados, mas a resposta anterior à limpeza não volta ao cache
+        self.assertIn("| period | sales |", result.content[0].text)
+        self.assertEqual(len(eia_server.data_cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()